@@ -5,40 +5,59 @@ This script contains all functions required to execute the DBSCAN clustering
 algorithm. This code is taken from 
 https://geoffboeing.com/2014/08/clustering-to-reduce-spatial-data-set-size/
 
-This script requires that `numpy`, `pandas`, `sklearn`, `geopy`, and `shapely`
-be installed within the Python environment you are running this script in.
+This script requires that `numpy` and `scipy` be installed within the Python
+environment you are running this script in. If `numba` is also installed, the
+cluster labelling loop is JIT-compiled.
 
 This file can be imported as a module and contains the following functions:
 
-    * get_centroid - Get the latitude/longitude tuple corresponding to the center of the given cluster
     * perform_DBSCAN - Executes DBSCAN clustering algorithm
 
 """
 
 import numpy as np
-import pandas as pd
 
-from sklearn.cluster import DBSCAN
-from geopy.distance import great_circle
-from shapely.geometry import MultiPoint
+from scipy.spatial import cKDTree
 
-def get_centroid(cluster):
-    """ Get the long/long coordinate corresponding to the center of the given cluster
+from stc import njit
+
+
+@njit(cache=True)
+def _find(parent, i):
+    """ Root of `i` in the union-find forest `parent`, halving the path on the way """
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+@njit(cache=True)
+def _union_find(n, pairs):
+    """ Connected components of `n` points linked by `pairs`
 
     Parameters
     ----------
-    cluster : list of tuples
-        list of lat/long coordinates belonging to a given cluster
+    n : int
+        number of points
+    pairs : 2D numpy array of int
+        index pairs of points within eps of each other
 
     Returns
     -------
-    tuple
-        lat/long coordinates for the centroid of `cluster`
+    numpy array of int
+        root of each point's component, which is the lowest index in it
     """
-    centroid = (MultiPoint(cluster).centroid.x, MultiPoint(cluster).centroid.y)
-    centermost_point = min(
-        cluster, key=lambda point: great_circle(point, centroid).m)
-    return tuple(centermost_point)
+    parent = np.arange(n)
+    for k in range(pairs.shape[0]):
+        a = _find(parent, pairs[k, 0])
+        b = _find(parent, pairs[k, 1])
+        if a < b:
+            parent[b] = a
+        elif b < a:
+            parent[a] = b
+    for i in range(n):
+        parent[i] = _find(parent, i)
+    return parent
 
 
 def perform_DBSCAN(coords, eepsilon=0.04):
@@ -56,20 +75,42 @@ def perform_DBSCAN(coords, eepsilon=0.04):
     -------
     cluster_labels: list of int
         list of cluster assignments for each lat/long coordinate in `coords`
-    centermost_points: list of tuples
-        list of DBSCAN cluster centroids
+    centermost_points: 2D numpy array
+        lat/long coordinates of each DBSCAN cluster's centermost point,
+        indexed by cluster label
     """
     kms_per_radian = 6371.0088
     epsilon = eepsilon / kms_per_radian
-    db = DBSCAN(
-        eps=epsilon,
-        min_samples=1,
-        algorithm='ball_tree',
-        metric='haversine').fit(
-        np.radians(coords))
-    cluster_labels = db.labels_
-    
-    num_clusters = len(set(cluster_labels)) # number of clusters after performing DBSCAN
-    clusters = pd.Series([coords[cluster_labels == n] for n in range(num_clusters)])
-    centermost_points = clusters.map(get_centroid)
+
+    # points on the unit sphere: chord length is monotonic in great-circle
+    # distance, so a euclidean kd-tree with the matching chord radius finds
+    # exactly the haversine eps-neighborhoods
+    lat, lon = np.radians(coords).T
+    xyz = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    # with min_samples=1 every point is a core point, so DBSCAN reduces to
+    # the connected components of the eps-neighborhood graph. Roots are the
+    # lowest index in each component, so ranking them numbers clusters in
+    # order of first appearance, as DBSCAN does.
+    pairs = cKDTree(xyz).query_pairs(r=2 * np.sin(epsilon / 2), output_type='ndarray')
+    roots = _union_find(len(coords), pairs)
+    cluster_labels = np.unique(roots, return_inverse=True)[1]
+
+    # bucket points by label with one stable sort, then reduce each bucket
+    # to its centroid and pick the first point nearest to it. Distances use
+    # a cos(lat)-scaled planar projection, which orders points the same way
+    # great-circle distance does except for near-ties
+    order = np.argsort(cluster_labels, kind='stable')
+    sorted_coords = coords[order]
+    sorted_labels = cluster_labels[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(sorted_labels)) + 1]
+    counts = np.diff(np.r_[starts, len(sorted_labels)])
+    centroids = np.add.reduceat(sorted_coords, starts, axis=0) / counts[:, None]
+
+    point_centroids = centroids[sorted_labels]
+    offsets = sorted_coords - point_centroids
+    offsets[:, 1] *= np.cos(np.radians(point_centroids[:, 0]))
+    sq_dist = (offsets ** 2).sum(axis=1)
+    nearest = np.flatnonzero(sq_dist == np.minimum.reduceat(sq_dist, starts)[sorted_labels])
+    first_nearest = nearest[np.unique(sorted_labels[nearest], return_index=True)[1]]
+    centermost_points = sorted_coords[first_nearest]
     return cluster_labels, centermost_points
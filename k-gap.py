@@ -5,56 +5,82 @@
 @author: sanjanamendu
 """
 
-from geopy.distance import GeodesicDistance
-from datetime import datetime
+from multiprocessing import Pool
 import itertools as it
+import os
 from tqdm import tqdm
+import numpy as np
 import pandas as pd
 
 max_d, max_t = 100, 60
+earth_radius_m = 6371008.8
 
 # %% Helper functions
-def sample_stretch_effort(s_i, s_j):
-    return 0.5 * spatial_stretch(s_i, s_j) + 0.5 * temporal_stretch(s_i, s_j)
-    
-# Distance between two points
-def spatial_stretch(s_i, s_j):
-    dist = GeodesicDistance((s_i.lat,s_i.lon),(s_j.lat,s_j.lon)).km * 1000
-    return dist/max_d if (dist <= max_d) else 1
-    
-# Overlap between two time intervals
-def temporal_stretch(s_i, s_j):
-    overlap =  (min(s_i.end,s_j.end)-max(s_i.start,s_j.start)).total_seconds()
-    return overlap/(max_t * 60) if (overlap >= 0) and (overlap <= max_t * 60) else 1
-
-# K-gap between two fingerprints
+def trace_arrays(f):
+    lat = np.radians(f.lat.to_numpy(dtype=float))
+    lon = np.radians(f.lon.to_numpy(dtype=float))
+    start = f.start.to_numpy().astype('datetime64[s]').view('i8')
+    end = f.end.to_numpy().astype('datetime64[s]').view('i8')
+    return lat, lon, start, end
+
+# Haversine distance (in meters) between every pair of samples. The n x m
+# matrices are float32; coordinates are first taken relative to a float64
+# reference point so the downcast keeps millimeter resolution.
+def spatial_stretch(lat1, lon1, lat2, lon2):
+    lat0, lon0 = lat1[0], lon1[0]
+    dlat = (lat1 - lat0).astype(np.float32)[:,None] - (lat2 - lat0).astype(np.float32)[None,:]
+    dlon = (lon1 - lon0).astype(np.float32)[:,None] - (lon2 - lon0).astype(np.float32)[None,:]
+    a = np.sin(dlat/2)**2 + np.cos(lat1).astype(np.float32)[:,None] * np.cos(lat2).astype(np.float32)[None,:] * np.sin(dlon/2)**2
+    dist = np.float32(2 * earth_radius_m) * np.arcsin(np.sqrt(a))
+    return np.where(dist <= max_d, dist/np.float32(max_d), np.float32(1))
+
+# Overlap between every pair of time intervals, computed in exact int64
+# seconds; only the resulting stretch matrix is float32
+def temporal_stretch(s1, e1, s2, e2):
+    overlap = np.minimum(e1[:,None], e2[None,:]) - np.maximum(s1[:,None], s2[None,:])
+    return np.where((overlap >= 0) & (overlap <= max_t * 60), overlap/(max_t * 60), 1.0).astype(np.float32)
+
+# K-gap between two fingerprints, given as trace_arrays() tuples
 def k_gap(f1,f2):
-    sse = [min([sample_stretch_effort(s_i, s_j) for j, s_j in f2.iterrows()]) for i, s_i in f1.iterrows()]
-    return sum(sse) / f1.shape[0]
+    lat1, lon1, s1, e1 = f1
+    lat2, lon2, s2, e2 = f2
+    sse = 0.5 * spatial_stretch(lat1, lon1, lat2, lon2) + 0.5 * temporal_stretch(s1, e1, s2, e2)
+    return sse.min(axis=1).mean()
 
-def get_trace(df,sid):
-    return df[df['SubjectID'] == sid].copy().reset_index(drop=True)
+# K-gap for one participant pair (top-level so Pool can pickle it)
+def _pair_kgap(args):
+    i, f_a, f_b = args
+    return i, k_gap(f_a,f_b) if len(f_a[0]) < len(f_b[0]) else k_gap(f_b,f_a)
 
 # %% Format data
 parameters = [[60,100,3]] # [1,0.1,6], [10,1,5], [30,10,4], 
 
-for temporal_threshold, spatial_threshold, max_dd in parameters:
-
-    dbscan_df = pd.read_csv("output/cluster/" + str(temporal_threshold) + "_" + str(spatial_threshold) + ".csv") \
-                  .round({'lat': max_dd, 'lon': max_dd, 'DBSCAN_Lat': max_dd, 'DBSCAN_Lon': max_dd})
-    dbscan_df['start'] = dbscan_df['start_time'].apply(lambda x: datetime.fromtimestamp(x))
-    dbscan_df['end'] = dbscan_df['end_time'].apply(lambda x: datetime.fromtimestamp(x))
-    dbscan_df = dbscan_df.rename(columns={'lat':'latitude', 'lon':'longitude', 'DBSCAN_Lat':'lat', 'DBSCAN_Lon':'lon'})
-
-# %% The main loop
-    participants = dbscan_df['SubjectID'].unique().tolist()[:10]
-    pairs = [(a,b) for (a,b) in it.combinations(participants, 2)]
-    fingerprints = [(get_trace(dbscan_df,a),get_trace(dbscan_df,b)) for (a,b) in pairs]
-    gaps = [k_gap(f_a,f_b) if f_a.shape[0] < f_b.shape[0] else k_gap(f_b,f_a) for (f_a,f_b) in tqdm(fingerprints)]
-    
-    df = pd.DataFrame(index=participants[:10],columns=participants[:10])
-    for i in range(len(pairs)):
-        (a,b) = pairs[i]
-        df.loc[a][b] = gaps[i]
-        df.loc[b][a] = gaps[i]
-    df.to_csv("output/k-gap/" + str(temporal_threshold) + "_" + str(spatial_threshold) + ".csv")
+if __name__ == "__main__":
+    for temporal_threshold, spatial_threshold, max_dd in parameters:
+
+        dbscan_df = pd.read_csv("output/cluster/" + str(temporal_threshold) + "_" + str(spatial_threshold) + ".csv") \
+                      .round({'lat': max_dd, 'lon': max_dd, 'DBSCAN_Lat': max_dd, 'DBSCAN_Lon': max_dd})
+        dbscan_df['start'] = pd.to_datetime(dbscan_df['start_time'], unit='s')
+        dbscan_df['end'] = pd.to_datetime(dbscan_df['end_time'], unit='s')
+        dbscan_df = dbscan_df.rename(columns={'lat':'latitude', 'lon':'longitude', 'DBSCAN_Lat':'lat', 'DBSCAN_Lon':'lon'})
+
+    # %% The main loop
+        participants = dbscan_df['SubjectID'].unique().tolist()[:10]
+        pairs = [(a,b) for (a,b) in it.combinations(participants, 2)]
+        traces = {sid: trace_arrays(g) for sid, g in dbscan_df[dbscan_df['SubjectID'].isin(participants)].groupby('SubjectID', sort=False)}
+        fingerprints = [(i, traces[a], traces[b]) for i, (a,b) in enumerate(pairs)]
+
+        gaps = [None] * len(pairs)
+        with Pool(processes=os.cpu_count()) as pool:
+            for i, gap in tqdm(pool.imap_unordered(_pair_kgap, fingerprints, chunksize=8), total=len(fingerprints),
+                               mininterval=1.0, miniters=max(1, len(fingerprints) // 100)):
+                gaps[i] = gap
+
+        idx = {sid: i for i, sid in enumerate(participants)}
+        ia = np.array([idx[a] for a, _ in pairs], dtype=int)
+        ib = np.array([idx[b] for _, b in pairs], dtype=int)
+        M = np.full((len(participants), len(participants)), np.nan, dtype=np.float32)
+        M[ia, ib] = gaps
+        M[ib, ia] = gaps
+        df = pd.DataFrame(M, index=participants, columns=participants)
+        df.to_csv("output/k-gap/" + str(temporal_threshold) + "_" + str(spatial_threshold) + ".csv")
@@ -10,18 +10,27 @@ Created on Sun Apr 25 21:28:20 2021
 """
 
 from tqdm import tqdm
+import numpy as np
 import pandas as pd
 import glob
 import os
 
-places = []
+files = sorted(glob.glob("../dataset/sensing/gps/gps_*.csv"))
+subjects = np.array([os.path.basename(f).split("_")[1].split(".")[0] for f in files])
+lats, lons, times, sids = [], [], [], []
 
-for f in tqdm(glob.glob("../dataset/sensing/gps/gps_*.csv")):
-    df = pd.read_csv(f,index_col=False)
-    df["Participant"] = os.path.basename(f).split("_")[1].split(".")[0]
-    df = df.sort_values(by="time", ascending=True).reset_index(drop=True)
-    df = df.rename(columns={"Participant": "SubjectID", "latitude": "lat", "longitude": "lon"})
-    df = df[['SubjectID', 'lat', 'lon', 'time']]
-    places.append(df)
+for i, f in enumerate(tqdm(files, mininterval=1.0, miniters=max(1, len(files) // 100))):
+    df = pd.read_csv(f, index_col=False, usecols=['latitude', 'longitude', 'time'],
+                     dtype={'latitude': 'float64', 'longitude': 'float64', 'time': 'int64'})
+    lats.append(df['latitude'].to_numpy())
+    lons.append(df['longitude'].to_numpy())
+    times.append(df['time'].to_numpy())
+    sids.append(np.full(len(df), i))
 
-pd.concat(places).to_csv("output/gps-merged.csv",index=False)
\ No newline at end of file
+lats, lons, times, sids = (np.concatenate(c) for c in (lats, lons, times, sids))
+order = np.lexsort((times, sids))  # by participant, then chronologically
+
+pd.DataFrame({'SubjectID': subjects[sids[order]],
+              'lat': lats[order],
+              'lon': lons[order],
+              'time': times[order]}).to_csv("output/gps-merged.csv", index=False)
@@ -5,6 +5,7 @@
 """
 
 from tqdm import tqdm
+import numpy as np
 import pandas as pd
 
 parameters = [[1,0.1,6], [10,1,5], [30,10,4], [60,100,3]]
@@ -12,20 +13,23 @@ parameters = [[1,0.1,6], [10,1,5], [30,10,4], [60,100,3]]
 for temporal_threshold, spatial_threshold, max_dd in parameters:
     
 #%% --------------------------- SPATIO-TEMPORAL --------------------------------
-# Use create_place_clusters function in stc.py file to
+# Use place_cluster_arrays function in stc.py file to
 # apply spatio-temporal clustering algorithm to each participant's data
 
-    from stc import create_place_clusters
+    from stc import place_cluster_arrays
     
     df = pd.read_csv("output/gps-merged.csv")
-    places = [df_i.reset_index(drop=True) for i, df_i in df.groupby('SubjectID')]
     
-    final_clusters = [create_place_clusters(i, spatial_threshold, temporal_threshold * 60) for i in tqdm(places)]
-    stc_df = pd.concat(final_clusters, 
-                       keys=df.SubjectID.unique(), \
-                       sort=False).reset_index(level=0) \
-                                  .rename(columns={'level_0': 'SubjectID'}) \
-                                  .reset_index(drop=True)
+    columns = {'SubjectID': [], 'lat': [], 'lon': [], 'time_durations': [], 'start_time': []}
+    subjects = df.groupby('SubjectID')
+    for sid, df_i in tqdm(subjects, mininterval=1.0, miniters=max(1, len(subjects) // 100)):
+        lat, lon, time_durations, start_time = place_cluster_arrays(df_i, spatial_threshold, temporal_threshold * 60)
+        columns['SubjectID'].append(np.full(len(lat), sid, dtype=object))
+        columns['lat'].append(lat)
+        columns['lon'].append(lon)
+        columns['time_durations'].append(time_durations)
+        columns['start_time'].append(start_time)
+    stc_df = pd.DataFrame({col: np.concatenate(arrays) for col, arrays in columns.items()})
     
     stc_df['start_time'] = stc_df.start_time.astype(int)
     stc_df['time_durations'] = stc_df.time_durations.astype(int)
@@ -37,24 +41,26 @@ for temporal_threshold, spatial_threshold, max_dd in parameters:
 
     from dbscan import perform_DBSCAN
     
-    clusters = []
-    for i, df_sub in tqdm(stc_df.groupby('SubjectID')):
-        coords = df_sub[['lat', 'lon']].copy().values
-        cluster_labels, centermost_points = perform_DBSCAN(coords, eepsilon=spatial_threshold / 1000)
+    # results are written in stc_df's row order, so keep it grouped by
+    # subject in sorted order regardless of how stc_df was assembled
+    stc_df = stc_df.sort_values('SubjectID', kind='stable', ignore_index=True)
+    coords = stc_df[['lat', 'lon']].to_numpy()
+    labels = np.empty(len(stc_df), dtype=int)
+    centers = np.empty((len(stc_df), 2))
+    subjects = stc_df.groupby('SubjectID').indices
+    for i, idx in tqdm(subjects.items(), mininterval=1.0, miniters=max(1, len(subjects) // 100)):
+        cluster_labels, centermost_points = perform_DBSCAN(coords[idx], eepsilon=spatial_threshold / 1000)
         
-        df_sub["DBScan_labels"] = cluster_labels
-        df_sub['DBScan_loc'] = df_sub.apply(lambda row: centermost_points[row["DBScan_labels"]], axis=1).astype(str)
-    
-        df_sub = pd.concat([df_sub,df_sub['DBScan_loc'].str.strip('()')
-                                                       .str.split(', ', expand=True)
-                                                       .rename(columns={0: 'DBSCAN_Lat', 1: 'DBSCAN_Lon'})], axis=1)
-    
-        clusters.append(df_sub)
+        labels[idx] = cluster_labels
+        centers[idx] = centermost_points[cluster_labels]
         
-    dbscan_df = pd.concat(clusters)
+    dbscan_df = stc_df.assign(DBScan_labels=labels, DBSCAN_Lat=centers[:, 0], DBSCAN_Lon=centers[:, 1])
     
     dbscan_df = dbscan_df.round({'lat': max_dd, 'lon': max_dd, 'DBSCAN_Lat': max_dd, 'DBSCAN_Lon': max_dd})
-    dbscan_df['start_time'] = dbscan_df['start_time'].apply(lambda x: x // (temporal_threshold) * (temporal_threshold))
-    dbscan_df['end_time'] = dbscan_df['end_time'].apply(lambda x: x // (temporal_threshold) * (temporal_threshold))
+    for col in ['start_time', 'end_time']:
+        grid = dbscan_df[col].to_numpy(copy=True)
+        np.floor_divide(grid, temporal_threshold, out=grid)
+        grid *= temporal_threshold
+        dbscan_df[col] = grid
     
     dbscan_df.to_csv("output/cluster/" + str(temporal_threshold) + "_" + str(spatial_threshold) + ".csv", index=False)
\ No newline at end of file
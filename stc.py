@@ -8,132 +8,133 @@ clustering algorithm described in the following paper:
     Predicting social anxiety from global positioning system traces of college
     students: feasibility study. JMIR mental health, 5(3), e10101.
 
-This script requires that `pandas` and `geopy` be installed within the Python
-environment you are running this script in.
+This script requires that `numpy` and `pandas` be installed within the Python
+environment you are running this script in. If `numba` is also installed, the
+clustering loop is JIT-compiled.
 
 This file can be imported as a module and contains the following functions:
 
-    * dist_point - Finds distance between any two points
-    * get_centroid - Get the latitude/longitude tuple corresponding to the center of the given cluster
-    * get_centroid_lat - Get the latitude of the center of the given cluster
-    * get_centroid_long - Get the longitude of the center of the given cluster
-    * dist_cluster_new_loc - Finds the distance between the cluster and the loc, using the centroid
-    * time_duration - Returns the total time spent at a given cluster
-    * create_place_clusters - Executes spatio-temporal clustering algorithm described by Boukhechba et al.
+    * place_cluster_arrays - Executes spatio-temporal clustering algorithm described by Boukhechba et al.
 
 """
 
-import pandas as pd
-import geopy.distance
+import math
 
+import numpy as np
 
-def dist_point(loc1, loc2):
-    """ Finds distance between any two points
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
 
-    Parameters
-    ----------
-    loc1 : tuple
-        latitude/longitude values for first point
-    loc2 : tuple
-        latitude/longitude values for second point
-
-    Returns
-    -------
-    float
-        geodesic distance between two points (i.e. `loc1` and `loc2`)
-    """
-    return(geopy.distance.geodesic(loc1, loc2).km) * 1000
-
-
-def get_centroid(cluster_loc):
-    """ Get the latitude/longitude tuple corresponding to the center of the given cluster
-
-    Parameters
-    ----------
-    cluster_loc : list of tuples
-        list of lat/long coordinates belonging to a given cluster
-
-    Returns
-    -------
-    tuple
-        lat/long coordinates for the centroid of `cluster_loc`
-    """
-    lat, long = [], []
-    for l in cluster_loc:
-        lat.append(l['loc'][0])
-        long.append(l['loc'][1])
-    return sum(lat) / len(lat), sum(long) / len(long)
+EARTH_RADIUS_M = 6371008.8
 
 
-def get_centroid_lat(cluster_loc):
-    """ Get the latitude of the center of the given cluster
+@njit(cache=True)
+def _hav_m(lat1, lon1, lat2, lon2):
+    """ Finds the haversine distance between two points
 
     Parameters
     ----------
-    cluster_loc : list of tuples
-        list of lat/long coordinates belonging to a given cluster
-
-    Returns
-    -------
-    float
-        latitude corresponding to the centroid of `cluster_loc`
-    """
-    lat = [l['loc'][0] for l in cluster_loc]
-    return sum(lat) / len(lat)
-
-
-def get_centroid_long(cluster_loc):
-    """ Get the longitude of the center of the given cluster
-
-    Parameters
-    ----------
-    cluster_loc : list of tuples
-        list of lat/long coordinates belonging to a given cluster
+    lat1, lon1 : float
+        latitude/longitude values for first point
+    lat2, lon2 : float
+        latitude/longitude values for second point
 
     Returns
     -------
     float
-        longitude corresponding to the centroid of `cluster_loc`
+        great-circle distance (in meters) between the two points
     """
-    long = [l['loc'][1] for l in cluster_loc]
-    return sum(long) / len(long)
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * \
+        math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
 
 
-def dist_cluster_new_loc(cluster, new_loc):
-    """ Finds the distance between the centroid of a given cluster and a point
+@njit(cache=True)
+def _stc_core(lat, lon, t, dist_thr, time_thr):
+    """ Spatio-temporal clustering state machine over raw coordinate arrays
 
     Parameters
     ----------
-    cluster : list of tuples
-        list of lat/long coordinates belonging to a given cluster
-    new_loc : tuple
-        lat/long coordinates of point
+    lat, lon, t : numpy.ndarray of float64
+        latitude, longitude and time (in seconds) of each GPS sample
+    dist_thr : float
+        maximum radius (in meters) of any cluster
+    time_thr : float
+        maximum time (in seconds) between sequential points in any cluster
 
     Returns
     -------
-    float
-        distance between the centroid of `cluster` and `new_loc`
+    out_lat, out_lon, out_start, out_dur : numpy.ndarray of float64
+        centroid, start time and time duration of each cluster
+    int
+        number of clusters written to the output arrays
     """
-    return (geopy.distance.geodesic(get_centroid(cluster), new_loc['loc']).km) * 1000
-
+    n_points = lat.shape[0]
+    out_lat = np.empty(n_points)
+    out_lon = np.empty(n_points)
+    out_start = np.empty(n_points)
+    out_dur = np.empty(n_points)
+    k = 0
+
+    # the current cluster is tracked through running lat/long sums so its
+    # centroid is available in O(1); ploc < 0 means there is no placeholder
+    sum_lat, sum_lon, n = lat[0], lon[0], 1
+    start_time = end_time = t[0]
+    ploc = -1
+
+    for i in range(1, n_points):
+
+        if _hav_m(sum_lat / n, sum_lon / n, lat[i], lon[i]) < dist_thr:
+            # Distance from cur_cluster to new_loc <  distance_threshold. Adding new_loc to cur_cluster
+            sum_lat += lat[i]
+            sum_lon += lon[i]
+            n += 1
+            end_time = t[i]
+            ploc = -1
+
+        elif ploc >= 0:
+            # 2nd out-of-cluster point found (ploc is set)
+
+            if end_time - start_time > time_thr:
+                # Time duration of current visit (cur_cluster) > time_threshold. Adding cur_cluster to final clusters
+                out_lat[k] = sum_lat / n
+                out_lon[k] = sum_lon / n
+                out_start[k] = start_time
+                out_dur[k] = end_time - start_time
+                k += 1
+
+            # Overwriting cur_cluster to document new visit, and adding
+            # ploc as the first point
+            sum_lat, sum_lon, n = lat[ploc], lon[ploc], 1
+            start_time = end_time = t[ploc]
+
+            if _hav_m(lat[ploc], lon[ploc], lat[i], lon[i]) < dist_thr:
+                # Distance from cur_cluster to new_loc < distance_threshold. Adding new_loc to cur_cluster (along with ploc)
+                sum_lat += lat[i]
+                sum_lon += lon[i]
+                n += 1
+                end_time = t[i]
+                ploc = -1
 
-def time_duration(cluster):
-    """ Returns the total time spent at a given cluster
+            else:
+                # Distance from cur_cluster to new_loc > distance_threshold. Setting new_loc as new ploc
+                ploc = i
 
-    Parameters
-    ----------
-    cluster : list of tuples
-        list of lat/long coordinates belonging to a given cluster
+        else:
+            # 1st out-of-cluster point found. Setting new_loc to as new ploc
+            ploc = i
 
-    Returns
-    -------
-    float
-        time (in seconds) spent at `cluster`
-    """
-    return cluster[len(cluster) - 1]['time'] - cluster[0]['time']
+    return out_lat, out_lon, out_start, out_dur, k
 
 
-def create_place_clusters(data_places, distance_threshold, time_threshold):
+def place_cluster_arrays(data_places, distance_threshold, time_threshold):
     """ Executes spatio-temporal clustering algorithm described by Boukhechba
         et al. (see paper for pseudocode implementation)
 
@@ -148,59 +149,14 @@ def create_place_clusters(data_places, distance_threshold, time_threshold):
 
     Returns
     -------
-    pandas.DataFrame
-        pandas DataFrame containing results of spatio-temporal clustering algorithm
+    lat, lon, time_durations, start_time : numpy.ndarray
+        centroid, time duration and start time of each cluster
     """
-
-    # list of the clusters with cluster's startpoint, time duration and the time spent.
-    final_clusters = []
-
-    # defining the first loc
-    first_loc = data_places.iloc[0]
-    first_loc_entry = {
-        'loc': (
-            first_loc['lat'],
-            first_loc['lon']),
-        'time': first_loc['time']}
-
-    cur_cluster = [first_loc_entry]  # we start with the first loc
-    ploc = None  # ploc (i.e. placeholder location) is taken to be just one variable, not the list
-
-    for index, row in data_places.drop(
-            0).iterrows():  # start itertating from second location in dataframe
-
-        new_loc = {'loc': (row['lat'], row['lon']), 'time': row['time']}
-
-        if(dist_cluster_new_loc(cur_cluster, new_loc) < distance_threshold):
-            # Distance from cur_cluster to new_loc <  distance_threshold. Adding new_loc to cur_cluster
-            cur_cluster.append(new_loc)
-            ploc = None
-
-        else:
-            if ploc is not None:
-                # 2nd out-of-cluster point found (ploc is not None)
-
-                if(time_duration(cur_cluster) > time_threshold):
-                    # Time duration of current visit (cur_cluster) > time_threshold. Adding cur_cluster to final clusters
-                    final_clusters.append({'lat': get_centroid_lat(cur_cluster), 'lon': get_centroid_long(
-                        cur_cluster), 'time_durations': time_duration(cur_cluster), 'start_time': cur_cluster[0]['time']})
-
-                # Overwriting cur_cluster to document new visit, and adding
-                # ploc as the first point
-                cur_cluster = []
-                cur_cluster.append(ploc)
-
-                if(dist_cluster_new_loc(cur_cluster, new_loc) < distance_threshold):
-                    # Distance from cur_cluster to new_loc < distance_threshold. Adding new_loc to cur_cluster (along with ploc)
-                    cur_cluster.append(new_loc)
-                    ploc = None
-
-                else:
-                    # Distance from cur_cluster to new_loc > distance_threshold. Setting new_loc as new ploc
-                    ploc = new_loc
-
-            else:
-                # 1st out-of-cluster point found. Setting new_loc to as new ploc
-                ploc = new_loc
-
-    return pd.DataFrame(final_clusters)
+    out_lat, out_lon, out_start, out_dur, k = _stc_core(
+        data_places['lat'].to_numpy(dtype=np.float64),
+        data_places['lon'].to_numpy(dtype=np.float64),
+        data_places['time'].to_numpy(dtype=np.float64),
+        float(distance_threshold),
+        float(time_threshold))
+
+    return out_lat[:k], out_lon[:k], out_dur[:k], out_start[:k]